@@ -1,11 +1,36 @@
 import os
-import hashlib
-import random
-import imghdr
+import logging
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from PIL import Image, ImageOps, ImageSequence
+from PIL import Image, ImageOps
 import torch
 from server import folder_paths 
+from .file_cache import folder_index, dir_listing_cache, file_fingerprint, LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Decoded (IMAGE, MASK) pairs shared by every LoadImagePlus instance, keyed by file fingerprint
+decoded_cache = LRUCache()
+
+def log_cache_stats(result):
+    # One line per cached load, enough to tell whether cache_mb is too small (evictions, low hit rate)
+    stats = decoded_cache.stats()
+    logger.info("LoadImagePlus cache %s: %d entries, %.1f/%.0f MB, %d hits, %d misses, %d evictions",
+                result, stats['entries'], stats['size_mb'], stats['budget_mb'], stats['hits'], stats['misses'], stats['evictions'])
+
+def fit_max_side(img, max_side):
+    # Shrink so the longest side is at most max_side, before anything is converted to float.
+    # Single-frame JPEGs are decoded at a reduced DCT scale via draft(), which is a no-op once loaded.
+    if max_side <= 0 or max(img.size) <= max_side:
+        return img
+    scale = max_side / max(img.size)
+    size = (max(1, round(img.size[0] * scale)), max(1, round(img.size[1] * scale)))
+    if img.format in ('JPEG', 'MPO') and getattr(img, 'n_frames', 1) == 1:
+        img.draft('RGB', size)
+    if img.mode in ('P', '1'):
+        img = img.convert('RGB')
+    # reducing_gap lets PIL do a cheap integer reduce() first and only resample the remainder
+    return img.resize(size, Image.LANCZOS, reducing_gap=3.0)
 
 class LoadImagePlus:
     def __init__(self):
@@ -14,16 +39,25 @@ class LoadImagePlus:
     @classmethod
     def INPUT_TYPES(cls):
         input_dir = folder_paths.get_input_directory()  # Ensure this method is correct
-        files = [f for f in os.listdir(input_dir) if os.path.isfile(os.path.join(input_dir, f))]
+        files = dir_listing_cache.list_files(input_dir)
         return {
             "required": {
-                "image": (sorted(files), {"image_upload": True}),
+                "image": (files, {"image_upload": True}),
                 "use_random_image": ("BOOLEAN", {"default": False}),
                 "random_folder": ("STRING", {"default": "."}),
                 "n_images": ("INT", {"default": 1, "min": 1, "max": 100}),
                 "seed": ("INT", {"default": 0, "min": 0, "max": 100000}),
                 "sort": ("BOOLEAN", {"default": False}),
                 "loop_sequence": ("BOOLEAN", {"default": False}),
+            },
+            "optional": {
+                "decode_workers": ("INT", {"default": 0, "min": 0, "max": 64}),
+                "cache_mb": ("INT", {"default": 1024, "min": 0, "max": 65536}),
+                "max_side": ("INT", {"default": 0, "min": 0, "max": 16384}),
+                "frame_start": ("INT", {"default": 0, "min": 0, "max": 1000000}),
+                "frame_stop": ("INT", {"default": 0, "min": 0, "max": 1000000}),
+                "frame_step": ("INT", {"default": 1, "min": 1, "max": 10000}),
+                "max_frames": ("INT", {"default": 0, "min": 0, "max": 1000000}),
             }
         }
 
@@ -31,15 +65,26 @@ class LoadImagePlus:
     RETURN_TYPES = ("IMAGE", "MASK")
     FUNCTION = "load_image"
 
-    def load_image(self, image, use_random_image, random_folder, n_images, seed, sort, loop_sequence):
+    def load_image(self, image, use_random_image, random_folder, n_images, seed, sort, loop_sequence, decode_workers=0, cache_mb=1024, max_side=0, frame_start=0, frame_stop=0, frame_step=1, max_frames=0):
         if use_random_image:
-            output_image, output_mask = self.load_random_image(random_folder, n_images, seed, sort, loop_sequence)
+            output_image, output_mask = self.load_random_image(random_folder, n_images, seed, sort, loop_sequence, decode_workers, max_side)
         else:
-            output_image, output_mask = self.load_specific_image(image)
+            output_image, output_mask = self.load_specific_image(image, cache_mb, max_side, frame_start, frame_stop, frame_step, max_frames)
         return (output_image, output_mask)
 
-    def load_specific_image(self, image):
+    def load_specific_image(self, image, cache_mb=1024, max_side=0, frame_start=0, frame_stop=0, frame_step=1, max_frames=0):
         image_path = folder_paths.get_annotated_filepath(image)
+
+        # cache_mb sets the shared budget, 0 bypasses the cache for this node
+        cache_key = None
+        if cache_mb > 0:
+            decoded_cache.set_budget(cache_mb)
+            cache_key = (file_fingerprint(image_path), max_side, frame_start, frame_stop, frame_step, max_frames)
+            cached = decoded_cache.get(cache_key)
+            if cached is not None:
+                log_cache_stats("hit")
+                return cached
+
         img = Image.open(image_path)
         
         output_images = []
@@ -48,8 +93,16 @@ class LoadImagePlus:
 
         excluded_formats = ['MPO']
         
-        for i in ImageSequence.Iterator(img):
-            i = ImageOps.exif_transpose(i)
+        # Only seek to the requested frames (frame_stop and max_frames of 0 mean no limit)
+        frame_indices = range(getattr(img, 'n_frames', 1))[frame_start:frame_stop or None:frame_step]
+        if max_frames > 0:
+            frame_indices = frame_indices[:max_frames]
+        if len(frame_indices) == 0:
+            raise ValueError("Frame range {}:{}:{} selects no frames from {}".format(frame_start, frame_stop, frame_step, image))
+
+        for frame_index in frame_indices:
+            img.seek(frame_index)
+            i = ImageOps.exif_transpose(fit_max_side(img, max_side))
 
             if i.mode == 'I':
                 i = i.point(lambda i: i * (1 / 255))
@@ -79,59 +132,76 @@ class LoadImagePlus:
             output_image = output_images[0]
             output_mask = output_masks[0]
 
-        return (output_image, output_mask)
-
-    def load_random_image(self, folder, n_images, seed, sort, loop_sequence):
-        files = [os.path.join(folder, f) for f in os.listdir(folder)]
-        files = [f for f in files if os.path.isfile(f)]
-        files = [f for f in files if any([f.endswith(ext) for ext in self.img_extensions])]
-        files = [f for f in files if imghdr.what(f)]
+        if cache_key is not None:
+            decoded_cache.put(cache_key, (output_image, output_mask))
+            log_cache_stats("miss")
 
-        random.seed(seed)
-        random.shuffle(files)
+        return (output_image, output_mask)
 
-        image_paths = files[:n_images]
+    def load_random_image(self, folder, n_images, seed, sort, loop_sequence, decode_workers=0, max_side=0):
+        # Seeded pick from the persistent folder index, only the picked files are statted
+        image_paths = folder_index.pick(folder, self.img_extensions, n_images, seed)
 
         if sort:
             image_paths = sorted(image_paths)
 
-        imgs = [Image.open(image_path) for image_path in image_paths]
-        output_images = []
-        for img in imgs:
-            img = ImageOps.exif_transpose(img)
-            if img.mode == 'I':
-                img = img.point(lambda i: i * (1 / 255))
-            image = img.convert("RGB")
-            image = np.array(image).astype(np.float32) / 255.0
-            output_images.append(image)
+        if not image_paths:
+            raise ValueError("No valid images found in folder: {}".format(folder))
+
+        # Decode the first image to learn the output size, then preallocate the whole batch
+        first = self.open_rgb(image_paths[0], max_side)
+        w, h = first.size
+        n_out = len(image_paths) + (1 if loop_sequence else 0)
+        output_image = torch.empty((n_out, h, w, 3), dtype=torch.float32)
+        self.write_rgb(first, output_image[0])
+        del first
+
+        def decode_into(idx):
+            image = self.open_rgb(image_paths[idx], max_side)
+            if image.size != (w, h):
+                raise ValueError("Image size mismatch: {} is {}x{}, expected {}x{}".format(image_paths[idx], image.size[0], image.size[1], w, h))
+            self.write_rgb(image, output_image[idx])
+
+        # PIL releases the GIL while decoding, so threads scale across cores
+        if decode_workers == 0:
+            decode_workers = os.cpu_count() or 1
+        decode_workers = min(decode_workers, len(image_paths) - 1)
+        if decode_workers > 1:
+            with ThreadPoolExecutor(max_workers=decode_workers) as executor:
+                list(executor.map(decode_into, range(1, len(image_paths))))
+        else:
+            for idx in range(1, len(image_paths)):
+                decode_into(idx)
 
         if loop_sequence:
-            output_images.append(output_images[0])
-
-        if len(output_images) > 1:
-            output_images = [torch.from_numpy(output_image)[None,] for output_image in output_images]
-            output_image = torch.cat(output_images, dim=0)
-        else:
-            output_image = torch.from_numpy(output_images[0])[None,]
+            output_image[-1].copy_(output_image[0])
 
         # Create a dummy mask
         mask = torch.zeros((output_image.shape[0], 64, 64), dtype=torch.float32, device="cpu")
 
         return (output_image, mask)
 
+    def open_rgb(self, image_path, max_side=0):
+        with Image.open(image_path) as img:
+            img = ImageOps.exif_transpose(fit_max_side(img, max_side))
+            if img.mode == 'I':
+                img = img.point(lambda i: i * (1 / 255))
+            return img.convert("RGB")
+
+    def write_rgb(self, image, out):
+        # Scale the uint8 pixels straight into the preallocated float32 slot, no per-image float copy
+        np.divide(np.asarray(image), np.float32(255.0), out=out.numpy())
+
     @classmethod
-    def IS_CHANGED(cls, image, use_random_image, random_folder, n_images, seed, sort, loop_sequence):
+    def IS_CHANGED(cls, image, use_random_image, random_folder, n_images, seed, sort, loop_sequence, decode_workers=0, cache_mb=1024, max_side=0, frame_start=0, frame_stop=0, frame_step=1, max_frames=0):
         if use_random_image:
             return seed  # Return seed to indicate change when using random images
         else:
             image_path = folder_paths.get_annotated_filepath(image)
-            m = hashlib.sha256()
-            with open(image_path, 'rb') as f:
-                m.update(f.read())
-            return m.digest().hex()
+            return file_fingerprint(image_path)
 
     @classmethod
-    def VALIDATE_INPUTS(cls, image, use_random_image, random_folder, n_images, seed, sort, loop_sequence):
+    def VALIDATE_INPUTS(cls, image, use_random_image, random_folder, n_images, seed, sort, loop_sequence, decode_workers=0, cache_mb=1024, max_side=0, frame_start=0, frame_stop=0, frame_step=1, max_frames=0):
         if not use_random_image:
             if not folder_paths.exists_annotated_filepath(image):
                 return "Invalid image file: {}".format(image)
@@ -1,11 +1,291 @@
 import os
-import hashlib
+import asyncio
 import random
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from PIL import Image, ImageOps
 import torch
 import cv2
+from aiohttp import web
 from server import folder_paths
+from .file_cache import file_fingerprint, DiskArrayCache, CACHE_DIR
+
+# Gaps longer than this are skipped with a CAP_PROP_POS_FRAMES seek instead of grab() calls
+SEEK_THRESHOLD = 48
+# Decoded frames allowed in flight between a video's decoder thread and its converter
+FRAME_QUEUE_SIZE = 16
+
+# Decoded clips keyed by file fingerprint plus decode parameters, shared by every LoadVideoPlus
+frame_cache = DiskArrayCache(os.path.join(CACHE_DIR, 'frames'))
+
+def iter_frames(cap, start_frame=0, frame_count=0, stride=1):
+    # Yields the BGR frames start_frame, start_frame + stride, ... (frame_count of 0 means until the end).
+    # Skipped frames are only grab()bed, so they are never retrieved, color converted or copied.
+    position = 0
+    target = start_frame
+    emitted = 0
+    while cap.isOpened() and (frame_count == 0 or emitted < frame_count):
+        if target - position > SEEK_THRESHOLD and cap.set(cv2.CAP_PROP_POS_FRAMES, target):
+            position = target
+        while position < target:
+            if not cap.grab():
+                return
+            position += 1
+
+        ret, frame = cap.read()
+        if not ret:
+            return
+        position += 1
+        emitted += 1
+        yield frame
+        target += stride
+
+def expected_frames(cap, start_frame=0, frame_count=0, stride=1):
+    # Container-reported estimate, which can be off (or 0) for VFR and some streams
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    n = len(range(start_frame, max(total, 0), stride))
+    if frame_count > 0:
+        n = min(n, frame_count)
+    return n
+
+OUTPUT_DTYPES = {
+    "float32": torch.float32,
+    "float16": torch.float16,
+    "uint8": torch.uint8,
+}
+
+def resolve_size(w, h, target_width=0, target_height=0, scale=1.0):
+    # A single target dimension keeps the aspect ratio, neither falls back to scale
+    if target_width > 0 and target_height > 0:
+        return (target_width, target_height)
+    if target_width > 0:
+        return (target_width, max(1, round(h * target_width / w)))
+    if target_height > 0:
+        return (max(1, round(w * target_height / h)), target_height)
+    return (max(1, round(w * scale)), max(1, round(h * scale)))
+
+class FrameBuffer:
+    # Converts BGR frames straight into preallocated [N,H,W,3] chunks. The first chunk is sized from
+    # the expected frame count; when that estimate is short, further chunks of grow_by frames are added.
+    # Frames are resized right after decode, so memory scales with the output size, not the source.
+    def __init__(self, expected, dtype=torch.float32, grow_by=64, target_width=0, target_height=0, scale=1.0):
+        self.expected = expected
+        self.dtype = dtype
+        self.grow_by = grow_by
+        self.target_width = target_width
+        self.target_height = target_height
+        self.scale = scale
+        self.chunks = []
+        self.free = 0
+        self.count = 0
+        self.source_size = None
+        self.size = None
+        self.rgb = None
+
+    def next_slot(self):
+        if self.free == 0:
+            n = self.expected if not self.chunks and self.expected > 0 else self.grow_by
+            h, w = self.size
+            self.chunks.append(torch.empty((n, h, w, 3), dtype=self.dtype))
+            self.free = n
+        chunk = self.chunks[-1]
+        slot = chunk[chunk.shape[0] - self.free]
+        self.free -= 1
+        self.count += 1
+        return slot.numpy()
+
+    def append(self, frame):
+        h, w = frame.shape[:2]
+        if self.source_size is None:
+            self.source_size = (h, w)
+            out_w, out_h = resolve_size(w, h, self.target_width, self.target_height, self.scale)
+            self.size = (out_h, out_w)
+        elif self.source_size != (h, w):
+            return False
+
+        if self.size != self.source_size:
+            out_h, out_w = self.size
+            interpolation = cv2.INTER_AREA if out_w * out_h < w * h else cv2.INTER_LINEAR
+            frame = cv2.resize(frame, (out_w, out_h), interpolation=interpolation)
+            h, w = out_h, out_w
+
+        slot = self.next_slot()
+        if self.dtype == torch.uint8:
+            cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=slot)
+        else:
+            if self.rgb is None:
+                self.rgb = np.empty((h, w, 3), dtype=np.uint8)
+            cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self.rgb)
+            np.divide(self.rgb, np.float32(255.0), out=slot)
+        return True
+
+    @classmethod
+    def wrap(cls, tensor):
+        buffer = cls(0, tensor.dtype)
+        buffer.chunks = [tensor]
+        buffer.count = tensor.shape[0]
+        buffer.size = buffer.source_size = tuple(tensor.shape[1:3])
+        return buffer
+
+    def append_copy(self, index):
+        source = self.tensor_slot(index)
+        self.next_slot()[...] = source
+
+    def tensor_slot(self, index):
+        for chunk in self.chunks:
+            if index < chunk.shape[0]:
+                return chunk[index].numpy()
+            index -= chunk.shape[0]
+        raise IndexError(index)
+
+    def filled_chunks(self):
+        if self.count == 0:
+            return []
+        last = self.chunks[-1]
+        return self.chunks[:-1] + [last[:last.shape[0] - self.free]]
+
+    def tensor(self):
+        if self.count == 0:
+            return None
+        chunks = self.filled_chunks()
+        if len(chunks) == 1:
+            output = chunks[0]
+            # Don't pin a mostly empty allocation when the reported frame count was far too high
+            if self.free > output.shape[0]:
+                output = output.clone()
+            return output
+        return torch.cat(chunks, dim=0)
+
+def decode_video(video_path, start_frame=0, frame_count=0, stride=1, target_width=0, target_height=0, scale=1.0, dtype=torch.float32, strict=False, reserve=0):
+    # A decoder thread feeds a bounded queue while this thread color converts into the buffer, so
+    # decode and conversion overlap (OpenCV releases the GIL in both). With strict, a frame whose size
+    # differs from the first one is an error instead of being skipped. reserve adds spare slots to the
+    # first chunk (e.g. for the loop_sequence frame) when the frame count is known.
+    cap = cv2.VideoCapture(video_path)
+    expected = expected_frames(cap, start_frame, frame_count, stride)
+    if expected > 0:
+        expected += reserve
+    buffer = FrameBuffer(expected, dtype, target_width=target_width, target_height=target_height, scale=scale)
+    frames = queue.Queue(maxsize=FRAME_QUEUE_SIZE)
+    errors = []
+    stop = threading.Event()
+
+    def reader():
+        try:
+            for frame in iter_frames(cap, start_frame, frame_count, stride):
+                if stop.is_set():
+                    break
+                frames.put(frame)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            frames.put(None)
+
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    mismatch = False
+    done = False
+    try:
+        while True:
+            frame = frames.get()
+            if frame is None:
+                done = True
+                break
+            if not buffer.append(frame) and strict:
+                mismatch = True
+                break
+    finally:
+        # Drain until the reader's sentinel so it never stays blocked on a full queue
+        stop.set()
+        while not done:
+            done = frames.get() is None
+        thread.join()
+        cap.release()
+
+    if errors:
+        raise errors[0]
+    if mismatch:
+        raise ValueError("Frame size mismatch in {}: expected {}x{}".format(video_path, buffer.source_size[1], buffer.source_size[0]))
+    return buffer
+
+def probe_video(video_path, start_frame=0, frame_count=0, stride=1, target_width=0, target_height=0, scale=1.0, output_dtype="float32"):
+    # Container metadata only, no frame is decoded. The estimate uses the same frame selection and
+    # resize rules as LoadVideoPlus, so it predicts the IMAGE tensor that loading would produce.
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError("Could not open video: {}".format(video_path))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+    selected = expected_frames(cap, start_frame, frame_count, stride)
+    cap.release()
+
+    codec = "".join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)).strip("\x00 ")
+    out_w, out_h = resolve_size(width, height, target_width, target_height, scale) if width and height else (0, 0)
+    element_size = torch.empty((), dtype=OUTPUT_DTYPES[output_dtype]).element_size()
+    return {
+        "fps": fps,
+        "frame_count": total_frames,
+        "width": width,
+        "height": height,
+        "codec": codec,
+        "duration": total_frames / fps if fps > 0 else 0.0,
+        "output_frames": selected,
+        "output_width": out_w,
+        "output_height": out_h,
+        "estimated_bytes": selected * out_h * out_w * 3 * element_size,
+    }
+
+def load_video_buffer(video_path, start_frame=0, frame_count=0, stride=1, target_width=0, target_height=0, scale=1.0, dtype=torch.float32, strict=False, disk_cache_gb=0, reserve=0):
+    # disk_cache_gb sets the shared cache budget, 0 bypasses the cache for this node
+    key = None
+    if disk_cache_gb > 0:
+        frame_cache.set_budget(disk_cache_gb)
+        key = (file_fingerprint(video_path), start_frame, frame_count, stride, target_width, target_height, scale, str(dtype))
+        cached = frame_cache.get(key)
+        if cached is not None:
+            return FrameBuffer.wrap(torch.from_numpy(cached))
+
+    buffer = decode_video(video_path, start_frame, frame_count, stride, target_width, target_height, scale, dtype, strict, reserve)
+    if key is not None and buffer.count > 0:
+        output = buffer.tensor()
+        frame_cache.put(key, output.numpy())
+        # Keep the decode buffer when tensor() didn't copy, so its reserved slots stay usable
+        if len(buffer.chunks) > 1 or output.data_ptr() != buffer.chunks[0].data_ptr():
+            return FrameBuffer.wrap(output)
+    return buffer
+
+def join_buffers(buffers, loop_sequence=False):
+    # Copies per-video buffers into one output in order, releasing each as soon as it's copied, so the
+    # peak is the output plus one video rather than twice the output. A single video is looped in place
+    # only when its buffer has a spare slot, otherwise it goes through the same preallocated copy.
+    if len(buffers) == 1:
+        buffer = buffers[0]
+        if not loop_sequence:
+            return buffer.tensor()
+        if len(buffer.chunks) == 1 and buffer.free > 0:
+            buffer.append_copy(0)
+            return buffer.tensor()
+
+    for buffer in buffers[1:]:
+        if buffer.size != buffers[0].size:
+            raise ValueError("Videos have different frame sizes: {}x{} and {}x{}".format(buffers[0].size[1], buffers[0].size[0], buffer.size[1], buffer.size[0]))
+    total = sum(buffer.count for buffer in buffers) + (1 if loop_sequence else 0)
+    h, w = buffers[0].size
+    output = torch.empty((total, h, w, 3), dtype=buffers[0].dtype)
+    offset = 0
+    while buffers:
+        buffer = buffers.pop(0)
+        for chunk in buffer.filled_chunks():
+            output[offset:offset + chunk.shape[0]].copy_(chunk)
+            offset += chunk.shape[0]
+        del buffer
+    if loop_sequence:
+        output[-1].copy_(output[0])
+    return output
 
 class LoadVideoPlus:
     def __init__(self):
@@ -22,67 +302,102 @@ class LoadVideoPlus:
                 "seed": ("INT", {"default": 0, "min": 0, "max": 100000}),
                 "sort": ("BOOLEAN", {"default": False}),
                 "loop_sequence": ("BOOLEAN", {"default": False}),
+            },
+            "optional": {
+                "start_frame": ("INT", {"default": 0, "min": 0, "max": 10000000}),
+                "frame_count": ("INT", {"default": 0, "min": 0, "max": 10000000}),
+                "stride": ("INT", {"default": 1, "min": 1, "max": 10000}),
+                "video_workers": ("INT", {"default": 0, "min": 0, "max": 64}),
+                "target_width": ("INT", {"default": 0, "min": 0, "max": 16384}),
+                "target_height": ("INT", {"default": 0, "min": 0, "max": 16384}),
+                "scale": ("FLOAT", {"default": 1.0, "min": 0.01, "max": 4.0, "step": 0.01}),
+                # uint8/float16 keep frames compact until the caller needs float32
+                "output_dtype": (list(OUTPUT_DTYPES.keys()), {"default": "float32", "tooltip": "uint8 and float16 are not standard IMAGE tensors, most nodes expect float32 in [0,1]. Pass the frames through Image To Float32 before any node that isn't dtype aware."}),
+                "disk_cache_gb": ("FLOAT", {"default": 0.0, "min": 0.0, "max": 4096.0, "step": 0.5}),
+                # > 0 streams the selected frames in chunks of this size, one chunk per queue execution
+                # (single video only, not supported with use_random_video)
+                "stream_chunk_size": ("INT", {"default": 0, "min": 0, "max": 100000}),
             }
         }
 
     CATEGORY = "🧔🏻‍♂️🇰 🇪 🇼 🇰 "
-    RETURN_TYPES = ("IMAGE", "MASK", "INT")
-    RETURN_NAMES = ("output_video", "output_mask", "frame_count")
+    RETURN_TYPES = ("IMAGE", "MASK", "INT", "INT", "BOOLEAN")
+    RETURN_NAMES = ("output_video", "output_mask", "frame_count", "chunk_index", "done")
     FUNCTION = "load_video"
 
-    def load_video(self, video, use_random_video, random_folder, n_videos, seed, sort, loop_sequence):
+    # Streaming cursors keyed by video path: {"params", "cursor", "chunk_index"}
+    stream_sessions = {}
+    stream_lock = threading.Lock()
+
+    def load_video(self, video, use_random_video, random_folder, n_videos, seed, sort, loop_sequence, start_frame=0, frame_count=0, stride=1, video_workers=0, target_width=0, target_height=0, scale=1.0, output_dtype="float32", disk_cache_gb=0.0, stream_chunk_size=0):
         if use_random_video:
-            output_video, output_mask, frame_count = self.load_random_video(random_folder, n_videos, seed, sort, loop_sequence)
+            output_video, output_mask, n_frames = self.load_random_video(random_folder, n_videos, seed, sort, loop_sequence, start_frame, frame_count, stride, video_workers, target_width, target_height, scale, output_dtype, disk_cache_gb)
+        elif stream_chunk_size > 0:
+            return self.load_video_chunk(video, start_frame, frame_count, stride, target_width, target_height, scale, output_dtype, disk_cache_gb, stream_chunk_size)
         else:
-            output_video, output_mask, frame_count = self.load_specific_video(video)
-        return (output_video, output_mask, frame_count)
+            output_video, output_mask, n_frames = self.load_specific_video(video, start_frame, frame_count, stride, target_width, target_height, scale, output_dtype, disk_cache_gb)
+        return (output_video, output_mask, n_frames, 0, True)
 
-    def load_specific_video(self, video):
+    def load_video_chunk(self, video, start_frame, frame_count, stride, target_width, target_height, scale, output_dtype, disk_cache_gb, chunk_size):
+        # Each execution loads the next chunk_size frames of the selection, so a long clip is processed
+        # at constant memory. The session resets when the parameters change or the last chunk is served.
+        # The end is found by decoding one frame past the chunk, since container frame counts can be wrong.
         video_path = folder_paths.get_annotated_filepath(video) if hasattr(folder_paths, 'get_annotated_filepath') else video
-        cap = cv2.VideoCapture(video_path)
-        
-        output_frames = []
-        w, h = None, None
-        frame_count = 0
-
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
+        params = (file_fingerprint(video_path), start_frame, frame_count, stride, target_width, target_height, scale, output_dtype, chunk_size)
+        with self.stream_lock:
+            session = self.stream_sessions.get(video_path)
+            if session is None or session["params"] != params:
+                session = {"params": params, "cursor": 0, "chunk_index": 0}
+                self.stream_sessions[video_path] = session
+            cursor = session["cursor"]
+            chunk_index = session["chunk_index"]
 
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            frame = ImageOps.exif_transpose(Image.fromarray(frame))
-            frame = np.array(frame).astype(np.float32) / 255.0
+        requested = chunk_size if frame_count == 0 else min(chunk_size, frame_count - cursor)
+        lookahead = 1 if frame_count == 0 or cursor + requested < frame_count else 0
+        buffer = load_video_buffer(video_path, start_frame + cursor * stride, requested + lookahead, stride, target_width, target_height, scale, OUTPUT_DTYPES[output_dtype], disk_cache_gb=disk_cache_gb)
+        output_video = buffer.tensor()
+        if output_video is None:
+            with self.stream_lock:
+                self.stream_sessions.pop(video_path, None)
+            raise ValueError("No frames were extracted from the video.")
 
-            if w is None and h is None:
-                w, h = frame.shape[1], frame.shape[0]
+        # Only a frame beyond this chunk proves there is another one to serve
+        done = output_video.shape[0] <= requested
+        output_video = output_video[:requested]
+        cursor += requested
+        with self.stream_lock:
+            if done:
+                self.stream_sessions.pop(video_path, None)
+            else:
+                session["cursor"] = cursor
+                session["chunk_index"] = chunk_index + 1
 
-            if frame.shape[1] != w or frame.shape[0] != h:
-                continue
-            
-            frame = torch.from_numpy(frame)[None,]
-            output_frames.append(frame)
-            frame_count += 1
+        # Create a dummy mask
+        output_mask = torch.zeros((output_video.shape[0], 64, 64), dtype=torch.float32, device="cpu")
 
-        cap.release()
-        
-        if not output_frames:
-            raise ValueError("No frames were extracted from the video.")
+        return (output_video, output_mask, output_video.shape[0], chunk_index, done)
 
-        if len(output_frames) > 1:
-            output_video = torch.cat(output_frames, dim=0)
-        else:
-            output_video = output_frames[0]
+    def load_specific_video(self, video, start_frame=0, frame_count=0, stride=1, target_width=0, target_height=0, scale=1.0, output_dtype="float32", disk_cache_gb=0.0):
+        video_path = folder_paths.get_annotated_filepath(video) if hasattr(folder_paths, 'get_annotated_filepath') else video
+        # Frames that don't match the first frame's size are skipped
+        buffer = load_video_buffer(video_path, start_frame, frame_count, stride, target_width, target_height, scale, OUTPUT_DTYPES[output_dtype], disk_cache_gb=disk_cache_gb)
+
+        output_video = buffer.tensor()
+        if output_video is None:
+            raise ValueError("No frames were extracted from the video.")
+        n_frames = output_video.shape[0]
 
         # Create a dummy mask
         output_mask = torch.zeros((output_video.shape[0], 64, 64), dtype=torch.float32, device="cpu")
 
-        return (output_video, output_mask, frame_count)
+        return (output_video, output_mask, n_frames)
 
-    def load_random_video(self, folder, n_videos, seed, sort, loop_sequence):
+    def load_random_video(self, folder, n_videos, seed, sort, loop_sequence, start_frame=0, frame_count=0, stride=1, video_workers=0, target_width=0, target_height=0, scale=1.0, output_dtype="float32", disk_cache_gb=0.0):
         files = [os.path.join(folder, f) for f in os.listdir(folder)]
         files = [f for f in files if os.path.isfile(f)]
         files = [f for f in files if any([f.endswith(ext) for ext in self.vid_extensions])]
+        # listdir order is filesystem dependent, sort first so a seed always picks the same videos
+        files = sorted(files)
 
         random.seed(seed)
         random.shuffle(files)
@@ -92,67 +407,152 @@ class LoadVideoPlus:
         if sort:
             video_paths = sorted(video_paths)
 
-        frames_list = []
-        frame_count = 0
+        # One decode pipeline per video; results are joined in video_paths order, so the output only
+        # depends on seed and sort, never on which thread finishes first
+        if video_workers == 0:
+            video_workers = os.cpu_count() or 1
+        video_workers = max(1, min(video_workers, len(video_paths)))
+        # A lone looped video gets a spare slot for the repeated first frame
+        reserve = 1 if loop_sequence and len(video_paths) == 1 else 0
+        with ThreadPoolExecutor(max_workers=video_workers) as executor:
+            buffers = list(executor.map(lambda path: load_video_buffer(path, start_frame, frame_count, stride, target_width, target_height, scale, OUTPUT_DTYPES[output_dtype], True, disk_cache_gb, reserve), video_paths))
 
-        for video_path in video_paths:
-            cap = cv2.VideoCapture(video_path)
-            while cap.isOpened():
-                ret, frame = cap.read()
-                if not ret:
-                    break
-
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                frame = ImageOps.exif_transpose(Image.fromarray(frame))
-                frame = np.array(frame).astype(np.float32) / 255.0
-                frames_list.append(frame)
-                frame_count += 1
-
-            cap.release()
-
-        if not frames_list:
+        buffers = [buffer for buffer in buffers if buffer.count > 0]
+        if not buffers:
             raise ValueError("No frames were extracted from the video(s).")
 
-        if loop_sequence:
-            frames_list.append(frames_list[0])
-            frame_count += 1
-
-        if len(frames_list) > 1:
-            frames_list = [torch.from_numpy(frame)[None,] for frame in frames_list]
-            output_video = torch.cat(frames_list, dim=0)
-        else:
-            output_video = torch.from_numpy(frames_list[0])[None,]
+        output_video = join_buffers(buffers, loop_sequence)
+        n_frames = output_video.shape[0]
 
         # Create a dummy mask
         mask = torch.zeros((output_video.shape[0], 64, 64), dtype=torch.float32, device="cpu")
 
-        return (output_video, mask, frame_count)
+        return (output_video, mask, n_frames)
 
     @classmethod
-    def IS_CHANGED(cls, video, use_random_video, random_folder, n_videos, seed, sort, loop_sequence):
+    def IS_CHANGED(cls, video, use_random_video, random_folder, n_videos, seed, sort, loop_sequence, start_frame=0, frame_count=0, stride=1, video_workers=0, target_width=0, target_height=0, scale=1.0, output_dtype="float32", disk_cache_gb=0.0, stream_chunk_size=0):
         if use_random_video:
             return seed  # Return seed to indicate change when using random videos
         else:
             video_path = folder_paths.get_annotated_filepath(video) if hasattr(folder_paths, 'get_annotated_filepath') else video
-            m = hashlib.sha256()
-            with open(video_path, 'rb') as f:
-                m.update(f.read())
-            return m.digest().hex()
+            if stream_chunk_size > 0:
+                # Every queued run must execute to advance the stream cursor
+                with cls.stream_lock:
+                    session = cls.stream_sessions.get(video_path)
+                    cursor = session["cursor"] if session is not None else 0
+                return "{}:{}".format(file_fingerprint(video_path), cursor)
+            return file_fingerprint(video_path)
 
     @classmethod
-    def VALIDATE_INPUTS(cls, video, use_random_video, random_folder, n_videos, seed, sort, loop_sequence):
+    def VALIDATE_INPUTS(cls, video, use_random_video, random_folder, n_videos, seed, sort, loop_sequence, start_frame=0, frame_count=0, stride=1, video_workers=0, target_width=0, target_height=0, scale=1.0, output_dtype="float32", disk_cache_gb=0.0, stream_chunk_size=0):
         if not use_random_video:
             if not os.path.isfile(video):
                 return "Invalid video file: {}".format(video)
         else:
             if not os.path.isdir(random_folder):
                 return "Invalid folder path: {}".format(random_folder)
+            if stream_chunk_size > 0:
+                return "stream_chunk_size is not supported with use_random_video"
+        return True
+
+class ProbeVideoPlus:
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "video": ("STRING", {"default": "X:/insert/path/here.mp4"}),
+            },
+            "optional": {
+                "start_frame": ("INT", {"default": 0, "min": 0, "max": 10000000}),
+                "frame_count": ("INT", {"default": 0, "min": 0, "max": 10000000}),
+                "stride": ("INT", {"default": 1, "min": 1, "max": 10000}),
+                "target_width": ("INT", {"default": 0, "min": 0, "max": 16384}),
+                "target_height": ("INT", {"default": 0, "min": 0, "max": 16384}),
+                "scale": ("FLOAT", {"default": 1.0, "min": 0.01, "max": 4.0, "step": 0.01}),
+                "output_dtype": (list(OUTPUT_DTYPES.keys()), {"default": "float32"}),
+            }
+        }
+
+    CATEGORY = "🧔🏻‍♂️🇰 🇪 🇼 🇰 "
+    RETURN_TYPES = ("FLOAT", "INT", "INT", "INT", "STRING", "INT")
+    RETURN_NAMES = ("fps", "frame_count", "width", "height", "codec", "estimated_bytes")
+    FUNCTION = "probe"
+
+    def probe(self, video, start_frame=0, frame_count=0, stride=1, target_width=0, target_height=0, scale=1.0, output_dtype="float32"):
+        video_path = folder_paths.get_annotated_filepath(video) if hasattr(folder_paths, 'get_annotated_filepath') else video
+        info = probe_video(video_path, start_frame, frame_count, stride, target_width, target_height, scale, output_dtype)
+        return (info["fps"], info["frame_count"], info["width"], info["height"], info["codec"], info["estimated_bytes"])
+
+    @classmethod
+    def IS_CHANGED(cls, video, **kwargs):
+        video_path = folder_paths.get_annotated_filepath(video) if hasattr(folder_paths, 'get_annotated_filepath') else video
+        return file_fingerprint(video_path)
+
+class ImageToFloat32:
+    # Turns a compact uint8/float16 IMAGE from LoadVideoPlus back into the float32 [0,1] batch stock nodes expect
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "images": ("IMAGE",),
+            }
+        }
+
+    CATEGORY = "🧔🏻‍♂️🇰 🇪 🇼 🇰 "
+    RETURN_TYPES = ("IMAGE",)
+    RETURN_NAMES = ("images",)
+    FUNCTION = "convert"
+
+    def convert(self, images):
+        if images.dtype == torch.float32:
+            return (images,)
+        if images.dtype == torch.uint8:
+            return (images.float().div_(255.0),)
+        return (images.float(),)
+
+async def probe_video_route_handler(request: web.Request):
+    video_path = request.query.get('path')
+    if not video_path:
+        return web.json_response({"error": "Missing 'path' query parameter"}, status=400)
+    if not os.path.isfile(video_path):
+        return web.json_response({"error": f"Video file not found: {video_path}"}, status=404)
+
+    try:
+        params = {
+            "start_frame": int(request.query.get('start_frame', 0)),
+            "frame_count": int(request.query.get('frame_count', 0)),
+            "stride": max(1, int(request.query.get('stride', 1))),
+            "target_width": int(request.query.get('target_width', 0)),
+            "target_height": int(request.query.get('target_height', 0)),
+            "scale": float(request.query.get('scale', 1.0)),
+            "output_dtype": request.query.get('output_dtype', 'float32'),
+        }
+    except ValueError as e:
+        return web.json_response({"error": f"Invalid query parameter: {e}"}, status=400)
+    if params["output_dtype"] not in OUTPUT_DTYPES:
+        return web.json_response({"error": f"Unknown output_dtype: {params['output_dtype']}"}, status=400)
+
+    try:
+        loop = asyncio.get_event_loop()
+        info = await loop.run_in_executor(None, lambda: probe_video(video_path, **params))
+    except ValueError as e:
+        return web.json_response({"error": str(e)}, status=422)
+    return web.json_response(info)
+
+def init_video_probe_route(prompt_server_instance):
+    if prompt_server_instance and hasattr(prompt_server_instance, 'app'):
+        prompt_server_instance.app.router.add_get('/api/kewky/probe_video', probe_video_route_handler)
         return True
+    return False
 
 NODE_CLASS_MAPPINGS = {
-    "LoadVideoPlus": LoadVideoPlus
+    "LoadVideoPlus": LoadVideoPlus,
+    "ProbeVideoPlus": ProbeVideoPlus,
+    "ImageToFloat32": ImageToFloat32,
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
-    "LoadVideoPlus": "Load Video Plus"
+    "LoadVideoPlus": "Load Video Plus",
+    "ProbeVideoPlus": "Probe Video Plus",
+    "ImageToFloat32": "Image To Float32",
 }
\ No newline at end of file
@@ -65,6 +65,12 @@ if PromptServer and hasattr(PromptServer, 'instance') and nodes:
 else:
     package_logger.warning("'Open Py File' feature could not be initialized due to missing PromptServer or nodes module.")
 
+from . import LoadVideoPlus as load_video_plus_module
+if PromptServer and hasattr(PromptServer, 'instance') and load_video_plus_module.init_video_probe_route(PromptServer.instance):
+    package_logger.info("Registered GET '/api/kewky/probe_video' route for video metadata probing.")
+else:
+    package_logger.warning("Video probe route could not be registered due to missing PromptServer.")
+
 
 # --- Your existing NODE_CLASS_MAPPINGS and NODE_DISPLAY_NAME_MAPPINGS ---
 _NODE_CLASS_MAPPINGS = {
@@ -3,9 +3,106 @@ import open_clip
 from clip_interrogator import Config, Interrogator
 from PIL import Image
 import os
+import gc
+import time
+import threading
 import numpy as np
-import json
 import hashlib
+from collections import OrderedDict
+from .tensor_utils import images_to_uint8
+from .file_cache import TextCache
+from .label_banks import BANK_KEYS, bank_base, legacy_pt_path, load_label_bank
+
+class InterrogatorPool:
+    # Loaded Interrogators shared by every node instance in the process, in LRU order. Models in use are
+    # never dropped; idle ones go when more than max_models are loaded, and ones released without
+    # keep_model_loaded also go after idle_seconds without use.
+    def __init__(self, max_models=1, idle_seconds=0):
+        self.max_models = max_models
+        self.idle_seconds = idle_seconds
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def set_limits(self, max_models, idle_seconds):
+        with self.lock:
+            self.max_models = max_models
+            self.idle_seconds = idle_seconds
+
+    def acquire(self, key, loader):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = {'interrogator': None, 'in_use': 0, 'last_used': time.time(), 'keep': False, 'lock': threading.Lock()}
+                self.entries[key] = entry
+            entry['in_use'] += 1
+            self.entries.move_to_end(key)
+
+        # Make room before loading, so the old weights are gone before the new ones arrive
+        self.evict()
+        try:
+            # Loading holds only this entry's lock, other models stay usable meanwhile
+            with entry['lock']:
+                if entry['interrogator'] is None:
+                    entry['interrogator'] = loader()
+        except Exception:
+            with self.lock:
+                entry['in_use'] -= 1
+                if entry['interrogator'] is None and entry['in_use'] == 0:
+                    self.entries.pop(key, None)
+            raise
+        return entry['interrogator']
+
+    def lock_for(self, key):
+        # Held while a node runs the model, since process_mode swaps image_to_features on the shared instance
+        with self.lock:
+            return self.entries[key]['lock']
+
+    def release(self, key, keep):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return
+            entry['in_use'] -= 1
+            entry['last_used'] = time.time()
+            entry['keep'] = keep
+        self.evict()
+        self.schedule()
+
+    def evict(self):
+        dropped = []
+        now = time.time()
+        with self.lock:
+            for key, entry in list(self.entries.items()):
+                if entry['in_use'] == 0 and not entry['keep'] and now - entry['last_used'] >= self.idle_seconds:
+                    dropped.append(self.entries.pop(key))
+            idle = [key for key, entry in self.entries.items() if entry['in_use'] == 0]
+            for key in idle[:max(0, len(self.entries) - self.max_models)]:
+                dropped.append(self.entries.pop(key))
+        if dropped:
+            print(f"Unloading {len(dropped)} interrogator model(s)")
+            del dropped
+            gc.collect()
+            torch.cuda.empty_cache()
+
+    def schedule(self):
+        # One daemon timer at a time, re-armed for whichever unpinned model goes idle next
+        with self.lock:
+            waiting = [entry['last_used'] for entry in self.entries.values() if entry['in_use'] == 0 and not entry['keep']]
+            if not waiting or self.timer is not None:
+                return
+            delay = max(0.0, min(waiting) + self.idle_seconds - time.time())
+            self.timer = threading.Timer(delay + 0.1, self.on_timer)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def on_timer(self):
+        with self.lock:
+            self.timer = None
+        self.evict()
+        self.schedule()
+
+interrogator_pool = InterrogatorPool()
 
 class CLIPInterrogatorNode:
     CATEGORY = "🧔🏻‍♂️🇰 🇪 🇼 🇰 "
@@ -16,22 +113,20 @@ class CLIPInterrogatorNode:
         self.current_model = None
         self.cache_path = os.path.join('models', 'clip-interrogator')
         self.embedding_directory = os.path.join('models', 'clip-interrogator', 'embeddings')
-        self.cache_file = os.path.join(self.cache_path, 'interrogation_cache.json')
-        self.load_cache()
-
-    def load_cache(self):
-        if os.path.exists(self.cache_file):
-            with open(self.cache_file, 'r') as f:
-                self.cache = json.load(f)
-        else:
-            self.cache = {}
+        self.cache_file = os.path.join(self.cache_path, 'interrogation_cache.db')
+        # Opened lazily on the first lookup. The old interrogation_cache.json is not imported, its
+        # MD5-of-PIL keys can never match the tensor hashes used now.
+        self.cache = TextCache(self.cache_file)
 
-    def save_cache(self):
-        with open(self.cache_file, 'w') as f:
-            json.dump(self.cache, f)
+    def save_cache(self, entries):
+        self.cache.put_many(entries)
 
-    def get_image_hash(self, image):
-        return hashlib.md5(image.tobytes()).hexdigest()
+    def get_image_hash(self, pixels):
+        # Hashed straight from the quantized uint8 frame, the shape keeps equal bytes in other layouts apart
+        h = hashlib.blake2b(digest_size=16)
+        h.update(repr(tuple(pixels.shape)).encode('utf-8'))
+        h.update(np.ascontiguousarray(pixels))
+        return h.hexdigest()
 
     @classmethod
     def INPUT_TYPES(cls):
@@ -47,6 +142,18 @@ class CLIPInterrogatorNode:
                 "use_precomputed": ("BOOLEAN", {"default": True}),
                 "use_cache": ("BOOLEAN", {"default": True}),
             },
+            "optional": {
+                # Uncached images go through the CLIP image encoder this many at a time
+                "encode_batch_size": ("INT", {"default": 16, "min": 1, "max": 256}),
+                # Least recently used entries beyond this count are dropped (0 = no limit)
+                "cache_max_entries": ("INT", {"default": 100000, "min": 0, "max": 100000000}),
+                # Entries not used for this many days are dropped (0 = keep forever)
+                "cache_max_age_days": ("INT", {"default": 0, "min": 0, "max": 36500}),
+                # Interrogator models kept loaded across all nodes, least recently used go first
+                "max_loaded_models": ("INT", {"default": 1, "min": 1, "max": 16}),
+                # Seconds a model released without keep_model_loaded stays loaded for the next run (0 = unload now)
+                "model_idle_timeout": ("INT", {"default": 0, "min": 0, "max": 86400}),
+            },
         }
 
     RETURN_TYPES = ("STRING", "STRING",)
@@ -75,118 +182,177 @@ class CLIPInterrogatorNode:
         ]
 
     def load_interrogator(self, clip_model_name, use_precomputed):
-        if self.interrogator is None or clip_model_name != self.current_model:
-            config = Config(
-                clip_model_name=clip_model_name,
-                device=self.device,
-                cache_path=self.cache_path
-            )
-            self.interrogator = Interrogator(config)
-            self.current_model = clip_model_name
-
-            if use_precomputed:
-                self.load_precomputed_embeddings(clip_model_name)
-
-    def load_precomputed_embeddings(self, clip_model_name):
-        embedding_files = {
-            'artists': f'{clip_model_name.split("/")[0]}_artists.pt',
-            'mediums': f'{clip_model_name.split("/")[0]}_mediums.pt',
-            'movements': f'{clip_model_name.split("/")[0]}_movements.pt',
-            'trendings': f'{clip_model_name.split("/")[0]}_trendings.pt',
-            'flavors': 'flavors.pt'
-        }
-
-        for key, filename in embedding_files.items():
-            path = os.path.join(self.embedding_directory, filename)
+        key = (clip_model_name, self.device, use_precomputed)
+        if self.interrogator is None or key != self.current_model:
+            self.unload_interrogator()
+            self.interrogator = interrogator_pool.acquire(key, lambda: self.create_interrogator(clip_model_name, use_precomputed))
+            self.current_model = key
+
+    def create_interrogator(self, clip_model_name, use_precomputed):
+        config = Config(
+            clip_model_name=clip_model_name,
+            device=self.device,
+            cache_path=self.cache_path
+        )
+        interrogator = Interrogator(config)
+
+        if use_precomputed:
+            self.load_precomputed_embeddings(clip_model_name, interrogator)
+        return interrogator
+
+    def load_precomputed_embeddings(self, clip_model_name, interrogator):
+        for key in BANK_KEYS:
+            # Memory-mapped banks are preferred, the label tables then read rows straight from the mapping.
+            # On CPU the image features are float32 and matmul needs matching rows, so float16 banks are
+            # cast there (build float32 banks with label_banks.py --dtype float32 to keep the mapping).
+            base = bank_base(self.embedding_directory, clip_model_name, key)
+            try:
+                bank = load_label_bank(base, dtype=np.float32 if self.device == "cpu" else None)
+            except (OSError, ValueError) as e:
+                print(f"Warning: Ignoring unreadable label bank {base}: {e}")
+                bank = None
+            table = getattr(interrogator, key, None)
+            if bank is not None and hasattr(table, 'embeds'):
+                table.labels, table.embeds = bank
+                continue
+
+            path = legacy_pt_path(self.embedding_directory, clip_model_name, key)
             if os.path.exists(path):
+                print(f"Loading {path} with torch.load, run label_banks.py to convert it to a memory-mapped bank")
                 embeddings = torch.load(path, map_location=self.device)
-                setattr(self.interrogator, key, embeddings)
+                setattr(interrogator, key, embeddings)
             else:
                 print(f"Warning: Precomputed embedding file not found: {path}")
 
-    def unload_interrogator(self):
+    def unload_interrogator(self, keep_model_loaded=False):
+        # Hands the model back to the pool, which decides when the weights are actually freed
         if self.interrogator is not None:
-            del self.interrogator
             self.interrogator = None
+            interrogator_pool.release(self.current_model, keep_model_loaded)
             self.current_model = None
-            torch.cuda.empty_cache()
 
-    def interrogate_image(self, image, clip_model_name, pos, neg, save_text, keep_model_loaded, output_dir, use_precomputed, use_cache):
+    def interrogate_image(self, image, clip_model_name, pos, neg, save_text, keep_model_loaded, output_dir, use_precomputed, use_cache, encode_batch_size=16, cache_max_entries=100000, cache_max_age_days=0, max_loaded_models=1, model_idle_timeout=0):
         if not self.validate_inputs(image, clip_model_name, pos, neg, save_text, keep_model_loaded, output_dir, use_precomputed, use_cache):
             return ("Error: Invalid inputs", "Error: Invalid inputs")
 
-        results_1 = []
-        results_2 = []
+        results_1 = [None] * image.shape[0]
+        results_2 = [None] * image.shape[0]
+
+        # Quantize the whole batch once instead of scanning and converting frame by frame
+        pixels = self.comfy_tensor_to_uint8(image)
 
+        # PIL images are only built for cache misses
+        pixels_np = pixels.numpy()
+        cache_keys = []
         for i in range(image.shape[0]):  # Iterate over the batch
-            pil_image = self.comfy_tensor_to_pil(image[i])
-            image_hash = self.get_image_hash(pil_image)
-            
-            cache_key_pos = f"{image_hash}_{clip_model_name}_{pos}"
-            cache_key_neg = f"{image_hash}_{clip_model_name}_{neg}"
-
-            if use_cache and cache_key_pos in self.cache and cache_key_neg in self.cache:
-                result_1 = self.cache[cache_key_pos]
-                result_2 = self.cache[cache_key_neg]
+            image_hash = self.get_image_hash(pixels_np[i])
+            cache_keys.append((f"{image_hash}_{clip_model_name}_{pos}", f"{image_hash}_{clip_model_name}_{neg}"))
+
+        # One indexed lookup for the whole batch
+        cached = {}
+        if use_cache:
+            self.cache.set_limits(cache_max_entries, cache_max_age_days)
+            cached = self.cache.get_many([key for keys in cache_keys for key in keys])
+
+        misses = []
+        for i, (cache_key_pos, cache_key_neg) in enumerate(cache_keys):
+            if cache_key_pos in cached and cache_key_neg in cached:
+                results_1[i] = cached[cache_key_pos]
+                results_2[i] = cached[cache_key_neg]
             else:
-                self.load_interrogator(clip_model_name, use_precomputed)
-                
-                result_1 = self.process_mode(pil_image, pos)
-                result_2 = self.process_mode(pil_image, neg)
-
-                if use_cache:
-                    self.cache[cache_key_pos] = result_1
-                    self.cache[cache_key_neg] = result_2
-                    self.save_cache()
+                misses.append((i, self.uint8_to_pil(pixels[i]), cache_key_pos, cache_key_neg))
 
-            results_1.append(result_1)
-            results_2.append(result_2)
-
-            if save_text:
-                self.save_text_file(f"image_{i}_output1", result_1, output_dir, image[i])
-                self.save_text_file(f"image_{i}_output2", result_2, output_dir, image[i])
+        if misses:
+            interrogator_pool.set_limits(max_loaded_models, model_idle_timeout)
+            try:
+                self.load_interrogator(clip_model_name, use_precomputed)
+                with interrogator_pool.lock_for(self.current_model):
+                    self.interrogate_misses(misses, pos, neg, use_cache, encode_batch_size, results_1, results_2)
+            finally:
+                self.unload_interrogator(keep_model_loaded)
 
-        if not keep_model_loaded:
-            self.unload_interrogator()
+        if save_text:
+            for i in range(image.shape[0]):
+                self.save_text_file(f"image_{i}_output1", results_1[i], output_dir, image[i])
+                self.save_text_file(f"image_{i}_output2", results_2[i], output_dir, image[i])
 
         combined_result_1 = "\n".join(results_1)
         combined_result_2 = "\n".join(results_2)
 
         return (combined_result_1, combined_result_2)
 
-    def process_mode(self, pil_image, mode):
-        if mode == 'best':
-            return self.interrogator.interrogate(pil_image)
-        elif mode == 'fast':
-            return self.interrogator.interrogate_fast(pil_image)
-        elif mode == 'classic':
-            return self.interrogator.interrogate_classic(pil_image)
-        elif mode == 'negative':
-            return self.interrogator.interrogate_negative(pil_image)
-        else:
-            raise ValueError(f"Unknown mode: {mode}")
+    def interrogate_misses(self, misses, pos, neg, use_cache, encode_batch_size, results_1, results_2):
+        # One encoder pass per micro-batch, the features are then shared by both modes
+        image_features = self.encode_images([pil_image for _, pil_image, _, _ in misses], encode_batch_size)
+        needs_caption = pos != 'negative' or neg != 'negative'
+
+        new_entries = {}
+        for n, (i, pil_image, cache_key_pos, cache_key_neg) in enumerate(misses):
+            features = image_features[n:n + 1]
+            caption = self.interrogator.generate_caption(pil_image) if needs_caption else None
+            results_1[i] = self.process_mode(pil_image, pos, features, caption)
+            results_2[i] = self.process_mode(pil_image, neg, features, caption)
+
+            new_entries[cache_key_pos] = results_1[i]
+            new_entries[cache_key_neg] = results_2[i]
+
+        # Written in one transaction per run
+        if use_cache:
+            self.save_cache(new_entries)
+
+    def encode_images(self, pil_images, batch_size):
+        # Same preprocessing and normalization as Interrogator.image_to_features, but batched
+        ci = self.interrogator
+        if hasattr(ci, '_prepare_clip'):
+            ci._prepare_clip()
+        features = []
+        for start in range(0, len(pil_images), batch_size):
+            batch = torch.stack([ci.clip_preprocess(img) for img in pil_images[start:start + batch_size]]).to(self.device)
+            with torch.no_grad(), torch.cuda.amp.autocast():
+                batch_features = ci.clip_model.encode_image(batch)
+                batch_features /= batch_features.norm(dim=-1, keepdim=True)
+            features.append(batch_features)
+        return torch.cat(features)
+
+    def process_mode(self, pil_image, mode, image_features=None, caption=None):
+        # The interrogate* methods all call image_to_features (best calls it three times), so
+        # precomputed features are swapped in on the instance for the duration of the call
+        if image_features is not None:
+            self.interrogator.image_to_features = lambda image: image_features
+        try:
+            if mode == 'best':
+                return self.interrogator.interrogate(pil_image, caption=caption)
+            elif mode == 'fast':
+                return self.interrogator.interrogate_fast(pil_image, caption=caption)
+            elif mode == 'classic':
+                return self.interrogator.interrogate_classic(pil_image, caption=caption)
+            elif mode == 'negative':
+                return self.interrogator.interrogate_negative(pil_image)
+            else:
+                raise ValueError(f"Unknown mode: {mode}")
+        finally:
+            if image_features is not None:
+                del self.interrogator.image_to_features
 
     def comfy_tensor_to_pil(self, tensor):
-        # Ensure the tensor is on CPU and detached from the computation graph
-        tensor = tensor.cpu().detach()
+        return self.uint8_to_pil(self.comfy_tensor_to_uint8(tensor[None])[0])
 
-        # Convert to numpy array
-        image_np = tensor.numpy()
+    def comfy_tensor_to_uint8(self, images):
+        # Ensure the batch has 4 dimensions (N, H, W, C)
+        if images.ndim != 4:
+            raise ValueError(f"Unexpected image shape: {tuple(images.shape)}")
 
-        # Ensure the image has 3 dimensions (H, W, C)
-        if image_np.ndim != 3:
-            raise ValueError(f"Unexpected image shape: {image_np.shape}")
+        # Values in [0, 1] are scaled to [0, 255], anything else is taken as already in [0, 255]
+        scale = 255.0 if images.max() <= 1.0 else 1.0
+        return images_to_uint8(images, scale=scale)
+
+    def uint8_to_pil(self, pixels):
+        image_np = pixels.numpy()
 
         # If the image is grayscale, convert to RGB
         if image_np.shape[-1] == 1:
             image_np = np.repeat(image_np, 3, axis=-1)
 
-        # Ensure the values are in the range [0, 255]
-        if image_np.max() <= 1.0:
-            image_np = (image_np * 255).astype(np.uint8)
-        else:
-            image_np = image_np.astype(np.uint8)
-
         # Create PIL Image
         return Image.fromarray(image_np)
 
@@ -0,0 +1,435 @@
+import os
+import json
+import random
+import imghdr
+import hashlib
+import logging
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def default_cache_dir():
+    # Kept out of the custom node package, since the frame cache alone can grow to disk_cache_gb.
+    # KEWKY_CACHE_DIR overrides it, otherwise it lives in ComfyUI's user directory.
+    if os.environ.get('KEWKY_CACHE_DIR'):
+        return os.environ['KEWKY_CACHE_DIR']
+    try:
+        from server import folder_paths
+        return os.path.join(folder_paths.get_user_directory(), 'kewky_tools', 'cache')
+    except (ImportError, AttributeError):
+        return os.path.join(tempfile.gettempdir(), 'kewky_tools_cache')
+
+
+CACHE_DIR = default_cache_dir()
+
+
+def write_json_atomic(path, data):
+    # Write to a temp file first so a crash or a second worker never leaves a half-written file behind
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class FolderIndex:
+    # Persistent per-folder index of validated image files: name -> [size, mtime_ns, format].
+    # The folder is only rescanned when its own mtime changes (files added, removed or renamed),
+    # and during a rescan only new or restatted files get their header sniffed again. Like
+    # DirListingCache, a scan taken within settle_seconds of the folder mtime is used but not trusted.
+    def __init__(self, index_dir=None, settle_seconds=2.0):
+        self.index_dir = index_dir or os.path.join(CACHE_DIR, 'folder_index')
+        self.settle_ns = int(settle_seconds * 1e9)
+        self.folders = {}
+        self.lock = threading.Lock()
+
+    def index_path(self, folder):
+        key = hashlib.sha1(folder.encode('utf-8')).hexdigest()
+        return os.path.join(self.index_dir, f"{key}.json")
+
+    def load_index(self, folder):
+        path = self.index_path(folder)
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    index = json.load(f)
+                if index.get('folder') == folder:
+                    return index
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable folder index {path}: {e}")
+        return {'folder': folder, 'dir_mtime_ns': None, 'extensions': [], 'entries': {}}
+
+    def save_index(self, index):
+        try:
+            write_json_atomic(self.index_path(index['folder']), index)
+        except OSError as e:
+            logger.warning(f"Could not persist folder index for {index['folder']}: {e}")
+
+    def sniff(self, path):
+        try:
+            return imghdr.what(path)
+        except OSError:
+            return None
+
+    def recheck_unsniffed(self, index):
+        # Files that didn't sniff as images are often still being written, and writing into an existing
+        # file doesn't change the folder mtime, so they are retried whenever their size or mtime moves
+        changed = False
+        for name, entry in index['entries'].items():
+            if entry[2]:
+                continue
+            path = os.path.join(index['folder'], name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if entry[0] != st.st_size or entry[1] != st.st_mtime_ns:
+                entry[:] = [st.st_size, st.st_mtime_ns, self.sniff(path)]
+                changed = True
+        return changed
+
+    def refresh(self, index, extensions, force=False):
+        folder = index['folder']
+        dir_mtime_ns = os.stat(folder).st_mtime_ns
+        if not force and index['dir_mtime_ns'] == dir_mtime_ns and index['extensions'] == list(extensions):
+            if not self.recheck_unsniffed(index):
+                return False
+            index['valid'] = sorted(name for name, e in index['entries'].items() if e[2])
+            self.save_index(index)
+            return True
+
+        old_entries = index['entries']
+        entries = {}
+        with os.scandir(folder) as it:
+            for entry in it:
+                if not entry.name.endswith(extensions):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    continue
+                old = old_entries.get(entry.name)
+                if old is not None and old[0] == st.st_size and old[1] == st.st_mtime_ns:
+                    fmt = old[2]
+                else:
+                    fmt = self.sniff(entry.path)
+                entries[entry.name] = [st.st_size, st.st_mtime_ns, fmt]
+
+        # Coarse mtime clocks can hide a write that lands right after the scan, so an unsettled scan
+        # leaves dir_mtime_ns unset (the next call rescans) and isn't persisted
+        settled = time.time_ns() - dir_mtime_ns > self.settle_ns
+        index['dir_mtime_ns'] = dir_mtime_ns if settled else None
+        index['extensions'] = list(extensions)
+        index['entries'] = entries
+        index['valid'] = sorted(name for name, e in entries.items() if e[2])
+        if settled:
+            self.save_index(index)
+        return True
+
+    def get_index(self, folder, extensions, force=False):
+        folder = os.path.abspath(folder)
+        index = self.folders.get(folder)
+        if index is None:
+            index = self.load_index(folder)
+            self.folders[folder] = index
+        if self.refresh(index, extensions, force) or 'valid' not in index:
+            index['valid'] = sorted(name for name, e in index['entries'].items() if e[2])
+        return index
+
+    def is_current(self, index, name):
+        # In-place edits don't touch the folder mtime, so picked files are re-statted individually
+        entry = index['entries'].get(name)
+        try:
+            st = os.stat(os.path.join(index['folder'], name))
+        except OSError:
+            return False
+        if entry[0] != st.st_size or entry[1] != st.st_mtime_ns:
+            entry[:] = [st.st_size, st.st_mtime_ns, self.sniff(os.path.join(index['folder'], name))]
+            return False
+        return True
+
+    def pick(self, folder, extensions, n, seed):
+        extensions = tuple(extensions)
+        with self.lock:
+            index = self.get_index(folder, extensions)
+            rng = random.Random(seed)
+            names = rng.sample(index['valid'], min(n, len(index['valid'])))
+            if not all(self.is_current(index, name) for name in names):
+                index = self.get_index(folder, extensions, force=True)
+                rng = random.Random(seed)
+                names = rng.sample(index['valid'], min(n, len(index['valid'])))
+            return [os.path.join(index['folder'], name) for name in names]
+
+
+folder_index = FolderIndex()
+
+
+class DirListingCache:
+    # Sorted file listings invalidated by the directory mtime. A listing taken within a couple of
+    # seconds of the last change is not trusted, since coarse mtime clocks can hide a second write.
+    def __init__(self, settle_seconds=2.0):
+        self.settle_ns = int(settle_seconds * 1e9)
+        self.listings = {}
+        self.lock = threading.Lock()
+
+    def list_files(self, directory):
+        directory = os.path.abspath(directory)
+        dir_mtime_ns = os.stat(directory).st_mtime_ns
+        with self.lock:
+            cached = self.listings.get(directory)
+        if cached is not None and cached[0] == dir_mtime_ns:
+            return cached[1]
+
+        with os.scandir(directory) as it:
+            files = sorted(entry.name for entry in it if entry.is_file())
+        if time.time_ns() - dir_mtime_ns > self.settle_ns:
+            with self.lock:
+                self.listings[directory] = (dir_mtime_ns, files)
+        return files
+
+
+dir_listing_cache = DirListingCache()
+
+
+class FingerprintCache:
+    # Content digests keyed by (path, size, mtime_ns, inode). While the stat is unchanged the earlier
+    # digest is reused, so re-validating an unchanged prompt costs a stat() instead of a full read.
+    def __init__(self, chunk_size=1 << 20):
+        self.chunk_size = chunk_size
+        self.digests = {}
+        self.lock = threading.Lock()
+
+    def stat_key(self, path):
+        st = os.stat(path)
+        return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+    def hash_file(self, path):
+        m = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.chunk_size), b''):
+                m.update(chunk)
+        return m.digest().hex()
+
+    def fingerprint(self, path):
+        path = os.path.abspath(path)
+        key = self.stat_key(path)
+        with self.lock:
+            cached = self.digests.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        digest = self.hash_file(path)
+        with self.lock:
+            self.digests[path] = (key, digest)
+        return digest
+
+
+fingerprint_cache = FingerprintCache()
+
+
+def file_fingerprint(path):
+    return fingerprint_cache.fingerprint(path)
+
+
+def nbytes(value):
+    if isinstance(value, (tuple, list)):
+        return sum(nbytes(v) for v in value)
+    return getattr(value, 'nbytes', 0)
+
+
+class LRUCache:
+    # Process-wide LRU with a byte budget. Values are tensors or tuples of tensors, sized via .nbytes
+    def __init__(self, max_mb=1024):
+        self.max_bytes = max_mb * 1024 * 1024
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def set_budget(self, max_mb):
+        with self.lock:
+            self.max_bytes = max_mb * 1024 * 1024
+            self.evict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = nbytes(value)
+        with self.lock:
+            if key in self.entries:
+                self.total_bytes -= self.entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self.entries[key] = (value, size)
+            self.total_bytes += size
+            self.evict()
+
+    def evict(self):
+        while self.total_bytes > self.max_bytes and self.entries:
+            _, (_, size) = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'size_mb': self.total_bytes / (1024 * 1024),
+                'budget_mb': self.max_bytes / (1024 * 1024),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class DiskArrayCache:
+    # Arrays stored as .npy files so a later load is a copy-on-write np.memmap instead of a decode.
+    # File mtimes double as LRU timestamps, and the directory is trimmed to the budget after each write.
+    def __init__(self, cache_dir, max_gb=20):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_gb * 1024 ** 3)
+        self.lock = threading.Lock()
+
+    def set_budget(self, max_gb):
+        self.max_bytes = int(max_gb * 1024 ** 3)
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha1(repr(key).encode('utf-8')).hexdigest() + '.npy')
+
+    def get(self, key):
+        path = self.path_for(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            array = np.load(path, mmap_mode='c')
+            os.utime(path)
+            return array
+        except (OSError, ValueError) as e:
+            logger.warning(f"Dropping unreadable cache file {path}: {e}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+    def put(self, key, array):
+        if array.nbytes > self.max_bytes:
+            return
+        path = self.path_for(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                np.save(f, array)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write cache file {path}: {e}")
+            return
+        self.trim()
+
+    def trim(self):
+        with self.lock:
+            files = []
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if entry.name.endswith('.npy'):
+                        try:
+                            st = entry.stat()
+                        except OSError:
+                            continue
+                        files.append((st.st_mtime_ns, st.st_size, entry.path))
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    # Still mapped by a live tensor on Windows, try again after the next write
+                    pass
+
+
+class TextCache:
+    # Key -> text store in SQLite (WAL mode), so lookups hit the primary key index instead of loading
+    # the whole cache, writers append instead of rewriting it, and several workers can share one file.
+    # Entries older than max_age_days (0 = no limit) or beyond the max_entries most recently used go first.
+    def __init__(self, db_path, max_entries=100000, max_age_days=0):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.conn = None
+        self.lock = threading.Lock()
+
+    def set_limits(self, max_entries, max_age_days):
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+
+    def connect(self):
+        if self.conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, accessed REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+            conn.commit()
+            self.conn = conn
+        return self.conn
+
+    def get_many(self, keys, chunk_size=500):
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self.lock:
+            conn = self.connect()
+            for start in range(0, len(keys), chunk_size):
+                chunk = keys[start:start + chunk_size]
+                placeholders = ",".join("?" * len(chunk))
+                found.update(conn.execute(f"SELECT key, value FROM cache WHERE key IN ({placeholders})", chunk).fetchall())
+            if found:
+                # Touch the hits so eviction keeps what is actually being used
+                now = time.time()
+                with conn:
+                    conn.executemany("UPDATE cache SET accessed = ? WHERE key = ?", [(now, key) for key in found])
+        return found
+
+    def put_many(self, items):
+        if not items:
+            return
+        now = time.time()
+        with self.lock:
+            conn = self.connect()
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO cache (key, value, accessed) VALUES (?, ?, ?)",
+                                 [(key, value, now) for key, value in items.items()])
+                self.evict(conn)
+
+    def evict(self, conn):
+        if self.max_age_days > 0:
+            conn.execute("DELETE FROM cache WHERE accessed < ?", (time.time() - self.max_age_days * 86400,))
+        if self.max_entries > 0:
+            conn.execute("DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                         (self.max_entries,))
@@ -1,10 +1,144 @@
 import os
+import io
+import json
+import hashlib
+import tarfile
+import threading
+import time
 import torch
 import numpy as np
 from PIL import Image
+import cv2
 import gc
 import psutil
 import shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .tensor_utils import images_to_uint8, QUANTIZE_CHUNK
+from .file_cache import write_json_atomic
+
+def encode_image(img_np, file_path, use_webp, webp_lossless, webp_quality):
+    pil_img = Image.fromarray(img_np)
+    if use_webp:
+        pil_img.save(file_path, format="WEBP", lossless=webp_lossless, quality=webp_quality)
+    else:
+        pil_img.save(file_path, format="PNG")
+
+def encode_image_bytes(img_np, use_webp, webp_lossless, webp_quality):
+    buffer = io.BytesIO()
+    encode_image(img_np, buffer, use_webp, webp_lossless, webp_quality)
+    return buffer.getvalue()
+
+# Per-frame content hashes of the last incremental save, so unchanged frames are not encoded again
+MANIFEST_FILE = "manifest.json"
+IMAGE_EXTENSIONS = (".png", ".webp")
+
+def load_manifest(output_dir, settings):
+    # Hashes only count when the frames were encoded with the same settings
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable manifest {manifest_path}: {e}")
+        return {}
+    if manifest.get("settings") != settings:
+        return {}
+    return manifest.get("frames", {})
+
+def frame_hash(img_np):
+    return hashlib.blake2b(np.ascontiguousarray(img_np), digest_size=16).hexdigest()
+
+# Single-file containers: one uncompressed tar of encoded frames, or one lossless FFV1 video
+CONTAINER_FILES = {
+    "tar": "images.tar",
+    "video_ffv1": "images.mkv",
+}
+
+class FrameArchiveReader:
+    # Random access by index into a container written by ImageBatcher. Tar members are read straight
+    # from their data offsets, video frames are reached with a CAP_PROP_POS_FRAMES seek. Matroska
+    # frame counts are estimated from the duration, so pass length when the real count is known.
+    def __init__(self, file_path, length=None):
+        self.file_path = file_path
+        self.is_video = file_path.endswith(".mkv")
+        if self.is_video:
+            self.cap = cv2.VideoCapture(file_path)
+            self.length = length if length is not None else int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            self.position = 0
+        else:
+            # Members are appended in frame order, and name order breaks past image_9999
+            with tarfile.open(file_path, "r") as tar:
+                members = [m for m in tar.getmembers() if m.isfile()]
+            self.members = [(m.offset_data, m.size) for m in members]
+            self.length = len(self.members)
+            self.file = open(file_path, "rb")
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        # Returns the frame as an [H, W, 3] uint8 RGB array
+        if index < 0 or index >= self.length:
+            raise IndexError(index)
+        if self.is_video:
+            if index != self.position:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            ret, frame = self.cap.read()
+            if not ret:
+                raise IndexError(index)
+            self.position = index + 1
+            return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        offset, size = self.members[index]
+        self.file.seek(offset)
+        with Image.open(io.BytesIO(self.file.read(size))) as img:
+            return np.array(img.convert("RGB"))
+
+    def load_all(self):
+        # Sequential read into one preallocated float32 batch
+        if self.length == 0:
+            raise ValueError(f"No frames in {self.file_path}")
+        first = self[0]
+        result = torch.empty((self.length, first.shape[0], first.shape[1], 3), dtype=torch.float32)
+        np.divide(first, np.float32(255.0), out=result[0].numpy())
+        for i in range(1, self.length):
+            np.divide(self[i], np.float32(255.0), out=result[i].numpy())
+        return result
+
+    def close(self):
+        if self.is_video:
+            self.cap.release()
+        else:
+            self.file.close()
+
+NPY_SPILL_DTYPES = {
+    "npy_float32": np.float32,
+    "npy_float16": np.float16,
+    "npy_uint8": np.uint8,
+}
+NPY_SPILL_PREFIX = "images_"
+
+def remove_old_spills(output_dir, keep):
+    # Best effort: on Windows a spill still mapped by an earlier output can't be removed yet and is
+    # picked up again by the next spill into this directory
+    for name in os.listdir(output_dir):
+        if name.startswith(NPY_SPILL_PREFIX) and name.endswith(".npy") and name != keep:
+            try:
+                os.remove(os.path.join(output_dir, name))
+            except OSError:
+                pass
+
+def load_npy_spill(file_path):
+    # float32 spills come back as a zero-copy, copy-on-write view of the file. Compact dtypes need one
+    # pass to float32, which reads the file sequentially at disk bandwidth instead of decoding images.
+    array = np.load(file_path, mmap_mode='c')
+    if array.dtype == np.float32:
+        return torch.from_numpy(array)
+    if array.dtype == np.uint8:
+        return torch.from_numpy(array).float().div_(255.0)
+    return torch.from_numpy(array).float()
 
 class ImageBatcher:
     @classmethod
@@ -19,11 +153,24 @@ class ImageBatcher:
                 "webp_quality": ("INT", {"default": 80, "min": 1, "max": 100}),
                 "clear_dir": ("BOOLEAN", {"default": False})
             },
+            "optional": {
+                # in_memory regroups the input tensor directly, disk_roundtrip reloads the saved files
+                "mode": (["disk_roundtrip", "in_memory"], {"default": "disk_roundtrip"}),
+                "save_to_disk": ("BOOLEAN", {"default": True}),
+                # PNG/WebP encoders release the GIL, so saves scale across cores on threads (0 = one per core)
+                "save_workers": ("INT", {"default": 0, "min": 0, "max": 64}),
+                # npy formats spill the raw tensor to one memory-mappable file, tar/video_ffv1 stream every
+                # frame into one container file instead of one file per image
+                "spill_format": (["image"] + list(NPY_SPILL_DTYPES.keys()) + list(CONTAINER_FILES.keys()), {"default": "image"}),
+                # Skip frames whose pixels match the manifest from the last run, clear_dir then only removes stale files
+                "incremental": ("BOOLEAN", {"default": False}),
+            },
             "hidden": {"prompt": "PROMPT", "extra_pnginfo": "EXTRA_PNGINFO"}
         }
 
-    RETURN_TYPES = ("IMAGE", "STRING", "STRING", "STRING")
-    RETURN_NAMES = ("images", "image_count", "batch_count", "debug_info")
+    RETURN_TYPES = ("IMAGE", "STRING", "STRING", "STRING", "IMAGE")
+    RETURN_NAMES = ("images", "image_count", "batch_count", "debug_info", "image_batches")
+    OUTPUT_IS_LIST = (False, False, False, False, True)
     FUNCTION = "process_images"
     CATEGORY = "🧔🏻‍♂️🇰 🇪 🇼 🇰 "
 
@@ -31,40 +178,48 @@ class ImageBatcher:
         self.image_count = "0"
         self.batch_count = "0"
         self.debug_info = ""
+        self.save_errors = []
+        self.skipped_count = 0
 
-    def process_images(self, images, batch_size, output_dir, use_webp, webp_lossless, webp_quality, clear_dir, prompt=None, extra_pnginfo=None):
+    def process_images(self, images, batch_size, output_dir, use_webp, webp_lossless, webp_quality, clear_dir, prompt=None, extra_pnginfo=None, mode="disk_roundtrip", save_to_disk=True, save_workers=0, spill_format="image", incremental=False):
         self.image_count = "0"
         self.batch_count = "0"
         self.debug_info = ""
-        
-        if clear_dir and os.path.exists(output_dir):
-            shutil.rmtree(output_dir)
-        
-        os.makedirs(output_dir, exist_ok=True)
-        file_extension = ".webp" if use_webp else ".png"
+        self.save_errors = []
+        self.skipped_count = 0
 
-        # Save images to disk and clear from memory
-        for i, img in enumerate(images):
-            img_np = (img.cpu().numpy() * 255).astype(np.uint8)
-            pil_img = Image.fromarray(img_np)
-            
-            file_path = os.path.join(output_dir, f"image_{i:04d}{file_extension}")
-            
-            if use_webp:
-                pil_img.save(file_path, format="WEBP", lossless=webp_lossless, quality=webp_quality)
-            else:
-                pil_img.save(file_path)
-            
-            del img_np, pil_img
-            self.image_count = str(int(self.image_count) + 1)
+        if mode == "in_memory":
+            return self.batch_in_memory(images, batch_size, output_dir, use_webp, webp_lossless, webp_quality, clear_dir, save_to_disk, prompt, extra_pnginfo, save_workers, spill_format, incremental)
 
-            # Update the count in the prompt if available
-            if prompt is not None:
-                prompt["image_count"] = self.image_count
-            
-            # Update the count in extra_pnginfo if available
-            if extra_pnginfo is not None:
-                extra_pnginfo["image_count"] = self.image_count
+        if spill_format in NPY_SPILL_DTYPES:
+            file_path = self.spill_npy(images, output_dir, spill_format, clear_dir, prompt, extra_pnginfo)
+            del images
+            torch.cuda.empty_cache()
+            gc.collect()
+
+            result = load_npy_spill(file_path)
+            self.batch_count = str(len(range(0, result.shape[0], batch_size)))
+            self.debug_info = self.build_debug_info(result, batch_size)
+            return (result, self.image_count, self.batch_count, self.debug_info, list(result.split(batch_size)))
+
+        if spill_format in CONTAINER_FILES:
+            file_path = self.save_container(images, output_dir, spill_format, use_webp, webp_lossless, webp_quality, clear_dir, prompt, extra_pnginfo, save_workers)
+            self.raise_save_errors(images.shape[0])
+            del images
+            torch.cuda.empty_cache()
+            gc.collect()
+
+            reader = FrameArchiveReader(file_path, int(self.image_count))
+            try:
+                result = reader.load_all()
+            finally:
+                reader.close()
+            self.batch_count = str(len(range(0, result.shape[0], batch_size)))
+            self.debug_info = self.build_debug_info(result, batch_size)
+            return (result, self.image_count, self.batch_count, self.debug_info, list(result.split(batch_size)))
+
+        file_extension = self.save_images(images, output_dir, use_webp, webp_lossless, webp_quality, clear_dir, prompt, extra_pnginfo, save_workers, incremental=incremental)
+        self.raise_save_errors(images.shape[0])
         
         # Clear the original images from memory
         del images
@@ -98,19 +253,222 @@ class ImageBatcher:
         del batched_images
         gc.collect()
 
-        # Prepare debug info
+        self.debug_info = self.build_debug_info(result, batch_size)
+
+        return (result, self.image_count, self.batch_count, self.debug_info, list(result.split(batch_size)))
+
+    def batch_in_memory(self, images, batch_size, output_dir, use_webp, webp_lossless, webp_quality, clear_dir, save_to_disk, prompt=None, extra_pnginfo=None, save_workers=0, spill_format="image", incremental=False):
+        # No codec round trip: the batches are views into the input tensor and disk is only a side output
+        if save_to_disk and spill_format in NPY_SPILL_DTYPES:
+            self.spill_npy(images, output_dir, spill_format, clear_dir, prompt, extra_pnginfo)
+        elif save_to_disk and spill_format in CONTAINER_FILES:
+            self.save_container(images, output_dir, spill_format, use_webp, webp_lossless, webp_quality, clear_dir, prompt, extra_pnginfo, save_workers)
+        elif save_to_disk:
+            self.save_images(images, output_dir, use_webp, webp_lossless, webp_quality, clear_dir, prompt, extra_pnginfo, save_workers, incremental=incremental)
+        else:
+            self.image_count = str(images.shape[0])
+
+        batches = list(images.split(batch_size))
+        self.batch_count = str(len(batches))
+        self.debug_info = self.build_debug_info(images, batch_size)
+
+        return (images, self.image_count, self.batch_count, self.debug_info, batches)
+
+    def save_images(self, images, output_dir, use_webp, webp_lossless, webp_quality, clear_dir, prompt=None, extra_pnginfo=None, save_workers=0, tar=None, incremental=False):
+        # With tar, frames are encoded in memory on the pool and appended to the archive in frame order
+        incremental = incremental and tar is None
+        if tar is None:
+            if clear_dir and not incremental and os.path.exists(output_dir):
+                shutil.rmtree(output_dir)
+            
+            os.makedirs(output_dir, exist_ok=True)
+        file_extension = ".webp" if use_webp else ".png"
+
+        settings = [use_webp, webp_lossless, webp_quality]
+        old_frames = load_manifest(output_dir, settings) if incremental else {}
+        frames = {}
+        if tar is None and not incremental and os.path.exists(os.path.join(output_dir, MANIFEST_FILE)):
+            # These files are about to be overwritten, so the old hashes no longer describe them
+            os.remove(os.path.join(output_dir, MANIFEST_FILE))
+
+        if save_workers == 0:
+            save_workers = os.cpu_count() or 1
+        # Bound the frames in flight so a long batch never holds more than a few uint8 copies at once
+        max_in_flight = save_workers * 2
+        pending = deque()
+
+        def collect(file_path, future):
+            try:
+                data = future.result()
+                if tar is not None:
+                    info = tarfile.TarInfo(os.path.basename(file_path))
+                    info.size = len(data)
+                    info.mtime = int(time.time())
+                    tar.addfile(info, io.BytesIO(data))
+            except Exception as e:
+                print(f"Failed to save {file_path}: {e}")
+                self.save_errors.append((file_path, str(e)))
+                frames.pop(os.path.basename(file_path), None)
+                return
+            count_saved()
+
+        def count_saved():
+            self.image_count = str(int(self.image_count) + 1)
+
+            # Update the count in the prompt if available
+            if prompt is not None:
+                prompt["image_count"] = self.image_count
+            
+            # Update the count in extra_pnginfo if available
+            if extra_pnginfo is not None:
+                extra_pnginfo["image_count"] = self.image_count
+
+        # Two uint8 buffers alternate between blocks. Submitting a block collects every save of the block
+        # before it, so by the time a buffer is reused nothing still reads from it.
+        block_shape = (min(max_in_flight, images.shape[0]),) + tuple(images.shape[1:])
+        buffers = [torch.empty(block_shape, dtype=torch.uint8) for _ in range(2)]
+
+        # Filenames come from the frame index, so the output is the same whatever order saves finish in
+        with ThreadPoolExecutor(max_workers=save_workers) as executor:
+            for block_index, block_start in enumerate(range(0, images.shape[0], max_in_flight)):
+                block = images[block_start:block_start + max_in_flight]
+                pixels = images_to_uint8(block, out=buffers[block_index % 2][:block.shape[0]])
+                for offset in range(pixels.shape[0]):
+                    i = block_start + offset
+                    file_name = f"image_{i:04d}{file_extension}"
+                    file_path = os.path.join(output_dir, file_name)
+                    if incremental:
+                        digest = frame_hash(pixels[offset].numpy())
+                        frames[file_name] = digest
+                        if old_frames.get(file_name) == digest and os.path.exists(file_path):
+                            self.skipped_count += 1
+                            count_saved()
+                            continue
+                    if tar is not None:
+                        future = executor.submit(encode_image_bytes, pixels[offset].numpy(), use_webp, webp_lossless, webp_quality)
+                    else:
+                        future = executor.submit(encode_image, pixels[offset].numpy(), file_path, use_webp, webp_lossless, webp_quality)
+                    pending.append((file_path, future))
+
+                    if len(pending) >= max_in_flight:
+                        collect(*pending.popleft())
+            while pending:
+                collect(*pending.popleft())
+
+        if incremental:
+            if clear_dir:
+                # Only frames left over from a longer or differently encoded run are removed
+                for name in os.listdir(output_dir):
+                    if name.endswith(IMAGE_EXTENSIONS) and name not in frames:
+                        os.remove(os.path.join(output_dir, name))
+            write_json_atomic(os.path.join(output_dir, MANIFEST_FILE), {"settings": settings, "frames": frames})
+
+        return file_extension
+
+    def save_container(self, images, output_dir, spill_format, use_webp, webp_lossless, webp_quality, clear_dir, prompt=None, extra_pnginfo=None, save_workers=0):
+        if spill_format == "video_ffv1" and (images.shape[1] % 2 or images.shape[2] % 2):
+            # OpenCV's FFV1 writer silently crops odd sizes down to the next even one
+            raise ValueError(f"video_ffv1 needs even frame dimensions, got {images.shape[2]}x{images.shape[1]}; use the tar spill_format for odd sizes")
+        if clear_dir and os.path.exists(output_dir):
+            shutil.rmtree(output_dir)
+        os.makedirs(output_dir, exist_ok=True)
+        file_path = os.path.join(output_dir, CONTAINER_FILES[spill_format])
+
+        if spill_format == "tar":
+            with tarfile.open(file_path, "w") as tar:
+                self.save_images(images, output_dir, use_webp, webp_lossless, webp_quality, False, prompt, extra_pnginfo, save_workers, tar=tar)
+            return file_path
+
+        # FFV1 is lossless, frames are converted and written as they are quantized
+        h, w = images.shape[1], images.shape[2]
+        writer = cv2.VideoWriter(file_path, cv2.VideoWriter_fourcc(*"FFV1"), 24.0, (w, h))
+        if not writer.isOpened():
+            raise RuntimeError(f"Could not open an FFV1 video writer for {file_path}")
+        try:
+            # Frames are written synchronously, so one uint8 buffer serves every block
+            buffer = torch.empty((min(QUANTIZE_CHUNK, images.shape[0]),) + tuple(images.shape[1:]), dtype=torch.uint8)
+            for block_start in range(0, images.shape[0], QUANTIZE_CHUNK):
+                block = images[block_start:block_start + QUANTIZE_CHUNK]
+                pixels = images_to_uint8(block, out=buffer[:block.shape[0]])
+                for offset in range(pixels.shape[0]):
+                    writer.write(cv2.cvtColor(pixels[offset].numpy(), cv2.COLOR_RGB2BGR))
+                    self.image_count = str(int(self.image_count) + 1)
+        finally:
+            writer.release()
+
+        if prompt is not None:
+            prompt["image_count"] = self.image_count
+        if extra_pnginfo is not None:
+            extra_pnginfo["image_count"] = self.image_count
+        return file_path
+
+    def spill_npy(self, images, output_dir, spill_format, clear_dir, prompt=None, extra_pnginfo=None):
+        if clear_dir and os.path.exists(output_dir):
+            # A spill an earlier output still maps can't be deleted on Windows, so this may leave some behind
+            shutil.rmtree(output_dir, ignore_errors=True)
+        os.makedirs(output_dir, exist_ok=True)
+
+        # Frames are written straight into the memmap, so the batch is never copied off the device whole.
+        # Every spill gets its own file name, so an earlier run's output that still maps its file is never
+        # replaced or truncated underneath it (which Windows refuses anyway while the mapping is open).
+        name = f"{NPY_SPILL_PREFIX}{time.time_ns()}_{os.getpid()}_{threading.get_ident()}.npy"
+        file_path = os.path.join(output_dir, name)
+        tmp_path = file_path + ".tmp"
+        dtype = NPY_SPILL_DTYPES[spill_format]
+        spill = None
+        try:
+            spill = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=dtype, shape=tuple(images.shape))
+            if dtype == np.uint8:
+                images_to_uint8(images, out=torch.from_numpy(spill))
+            else:
+                for i, img in enumerate(images):
+                    spill[i] = img.cpu().numpy()
+            spill.flush()
+            del spill
+            spill = None
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            del spill
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        remove_old_spills(output_dir, name)
+
+        self.image_count = str(images.shape[0])
+        if prompt is not None:
+            prompt["image_count"] = self.image_count
+        if extra_pnginfo is not None:
+            extra_pnginfo["image_count"] = self.image_count
+        return file_path
+
+    def raise_save_errors(self, total):
+        # The reload would return a shorter, shifted batch (or pick up stale files), so a failed save stops here
+        if self.save_errors:
+            message = f"Failed to save {len(self.save_errors)} of {total} image(s):"
+            for file_path, error in self.save_errors:
+                message += f"\n  {file_path}: {error}"
+            raise RuntimeError(message)
+
+    def build_debug_info(self, result, batch_size):
         process = psutil.Process(os.getpid())
         memory_info = process.memory_info()
         gpu_memory_allocated = torch.cuda.memory_allocated() / 1e9
 
-        self.debug_info = f"Total images: {self.image_count}\n"
-        self.debug_info += f"Batch size: {batch_size}\n"
-        self.debug_info += f"Number of batches: {self.batch_count}\n"
-        self.debug_info += f"Shape of result tensor: {result.shape}\n"
-        self.debug_info += f"CPU Memory usage: {memory_info.rss / 1e9:.2f} GB\n"
-        self.debug_info += f"GPU Memory usage: {gpu_memory_allocated:.2f} GB"
-
-        return (result, self.image_count, self.batch_count, self.debug_info)
+        debug_info = f"Total images: {self.image_count}\n"
+        debug_info += f"Batch size: {batch_size}\n"
+        debug_info += f"Number of batches: {self.batch_count}\n"
+        debug_info += f"Shape of result tensor: {result.shape}\n"
+        debug_info += f"CPU Memory usage: {memory_info.rss / 1e9:.2f} GB\n"
+        debug_info += f"GPU Memory usage: {gpu_memory_allocated:.2f} GB"
+        if self.skipped_count:
+            debug_info += f"\nUnchanged (not re-encoded): {self.skipped_count}"
+        if self.save_errors:
+            debug_info += f"\nFailed to save {len(self.save_errors)} file(s):"
+            for file_path, error in self.save_errors:
+                debug_info += f"\n  {file_path}: {error}"
+        return debug_info
 
 NODE_CLASS_MAPPINGS = {
     "ImageBatcher": ImageBatcher
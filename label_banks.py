@@ -0,0 +1,102 @@
+import os
+import json
+import argparse
+import threading
+import numpy as np
+
+# Label banks are an .npy matrix of normalized text embeddings (one row per label) next to a JSON list of
+# the labels. np.load with mmap_mode maps the rows straight from the page cache, so loading a bank costs
+# no deserialization and every process using the same bank shares one copy of it.
+BANK_KEYS = ('artists', 'mediums', 'movements', 'trendings', 'flavors')
+
+def bank_base(directory, clip_model_name, key):
+    return os.path.join(directory, f'{clip_model_name.split("/")[0]}_{key}')
+
+def legacy_pt_path(directory, clip_model_name, key):
+    if key == 'flavors':
+        return os.path.join(directory, 'flavors.pt')
+    return os.path.join(directory, f'{clip_model_name.split("/")[0]}_{key}.pt')
+
+def save_label_bank(base, labels, embeds, dtype=np.float16):
+    # clip_interrogator keeps its label embeddings as float16 rows, so that is the default here too
+    embeds = np.stack([np.asarray(e, dtype=dtype) for e in embeds]) if len(embeds) else np.zeros((0, 0), dtype=dtype)
+    if embeds.shape[0] != len(labels):
+        raise ValueError(f"{base}: {len(labels)} labels but {embeds.shape[0]} embeddings")
+    os.makedirs(os.path.dirname(base) or '.', exist_ok=True)
+    suffix = f"{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(f"{base}.npy.{suffix}", 'wb') as f:
+        np.save(f, embeds)
+    with open(f"{base}.labels.json.{suffix}", 'w', encoding='utf-8') as f:
+        json.dump(list(labels), f)
+    os.replace(f"{base}.npy.{suffix}", base + '.npy')
+    os.replace(f"{base}.labels.json.{suffix}", base + '.labels.json')
+
+def load_label_bank(base, dtype=None):
+    if not (os.path.exists(base + '.npy') and os.path.exists(base + '.labels.json')):
+        return None
+    # Copy-on-write, so torch.from_numpy on a row gets a writable array without copying the file
+    embeds = np.load(base + '.npy', mmap_mode='c')
+    with open(base + '.labels.json', 'r', encoding='utf-8') as f:
+        labels = json.load(f)
+    if embeds.shape[0] != len(labels):
+        raise ValueError(f"{base}: {len(labels)} labels but {embeds.shape[0]} embeddings")
+    if dtype is not None and embeds.dtype != dtype:
+        # Only a bank already stored in the wanted dtype stays memory-mapped
+        embeds = embeds.astype(dtype)
+    return labels, embeds
+
+def to_rows(embeds):
+    return [np.asarray(e.detach().float().cpu() if hasattr(e, 'detach') else e) for e in embeds]
+
+def convert_pt(pt_path, base, dtype=np.float16):
+    # Accepts a pickled LabelTable or a dict with 'labels' and 'embeds'
+    import torch
+    obj = torch.load(pt_path, map_location='cpu', weights_only=False)
+    if isinstance(obj, dict):
+        labels, embeds = obj.get('labels'), obj.get('embeds')
+    else:
+        labels, embeds = getattr(obj, 'labels', None), getattr(obj, 'embeds', None)
+    if labels is None or embeds is None:
+        raise ValueError(f"{pt_path} has no labels/embeds to convert")
+    save_label_bank(base, labels, to_rows(embeds), dtype)
+
+def build_missing_banks(clip_model_name, directory, cache_path, device, dtype=np.float16):
+    # Interrogator computes (or loads from its own cache) every label table on construction
+    from clip_interrogator import Config, Interrogator
+    missing = [key for key in BANK_KEYS if load_label_bank(bank_base(directory, clip_model_name, key)) is None]
+    if not missing:
+        return []
+    interrogator = Interrogator(Config(clip_model_name=clip_model_name, device=device, cache_path=cache_path))
+    for key in missing:
+        table = getattr(interrogator, key)
+        save_label_bank(bank_base(directory, clip_model_name, key), table.labels, to_rows(table.embeds), dtype)
+    return missing
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert interrogator .pt label embeddings to memory-mapped banks")
+    parser.add_argument('--model', required=True, help="CLIP model name, e.g. ViT-L-14/openai")
+    parser.add_argument('--dir', default=os.path.join('models', 'clip-interrogator', 'embeddings'))
+    parser.add_argument('--cache-path', default=os.path.join('models', 'clip-interrogator'))
+    parser.add_argument('--build-missing', action='store_true', help="Compute banks that have no .pt to convert")
+    parser.add_argument('--device', default='cpu')
+    # float32 banks stay memory-mapped when the interrogator runs on CPU, float16 halves the size for GPU
+    parser.add_argument('--dtype', choices=['float16', 'float32'], default='float16')
+    args = parser.parse_args()
+    dtype = np.dtype(args.dtype)
+
+    for key in BANK_KEYS:
+        pt_path = legacy_pt_path(args.dir, args.model, key)
+        base = bank_base(args.dir, args.model, key)
+        if os.path.exists(pt_path) and load_label_bank(base) is None:
+            try:
+                convert_pt(pt_path, base, dtype)
+                print(f"Converted {pt_path} -> {base}.npy")
+            except ValueError as e:
+                print(f"Skipped {pt_path}: {e}")
+
+    if args.build_missing:
+        for key in build_missing_banks(args.model, args.dir, args.cache_path, args.device, dtype):
+            print(f"Built {bank_base(args.dir, args.model, key)}.npy")
+
+if __name__ == "__main__":
+    main()